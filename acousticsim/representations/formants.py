@@ -1,17 +1,13 @@
-
+import warnings
 
 from acousticsim.representations.base import Representation
-from acousticsim.representations.helper import preproc,nextpow2
+from acousticsim.representations.helper import preproc
 
 import numpy as np
-import scipy as sp
-import scipy.signal as sig
 
-from scipy.fftpack import fft,ifft
+from scipy.fft import rfft,irfft,next_fast_len
+from scipy.linalg import solve_toeplitz
 from scipy.signal import resample, gaussian
-from numpy import (pad,log,array,zeros, floor,exp,sqrt,dot,arange,
-                    hanning,sin, pi,linspace,log10,round,maximum,minimum,
-                    sum,cos,spacing,diag,ceil)
 
 def lpc_ref(signal, order):
     """Compute the Linear Prediction Coefficients.
@@ -32,8 +28,10 @@ def lpc_ref(signal, order):
 
     Notes
     ----
-    This is just for reference, as it is using the direct inversion of the
-    toeplitz matrix, which is really slow"""
+    This is just for reference, and is deprecated in favor of ``lpc``, which
+    computes the autocorrelation with an fft."""
+    warnings.warn("lpc_ref is deprecated, use lpc instead", DeprecationWarning,
+                  stacklevel=2)
     if signal.ndim > 1:
         raise ValueError("Array of rank > 1 not supported yet")
     if order > signal.size:
@@ -47,7 +45,7 @@ def lpc_ref(signal, order):
         nx = np.min([p, signal.size])
         x = np.correlate(signal, signal, 'full')
         r[:nx] = x[signal.size-1:signal.size+order]
-        phi = np.dot(sp.linalg.inv(sp.linalg.toeplitz(r[:-1])), -r[1:])
+        phi = solve_toeplitz(r[:-1], -r[1:])
         return np.concatenate(([1.], phi))
     else:
         return np.ones(1, dtype = signal.dtype)
@@ -66,8 +64,9 @@ def levinson_1d(r, order):
 
     Notes
     ----
-    This implementation is in python, hence unsuitable for any serious
-    computation. Use it as educational and reference purpose only.
+    The outer recursion over the order is done in python, but the inner
+    loops over the coefficients are vectorized, so each step costs a
+    constant number of numpy calls.
 
     Levinson is a well-known algorithm to solve the Hermitian toeplitz
     equation:
@@ -107,25 +106,68 @@ def levinson_1d(r, order):
     e = r[0]
 
     for i in range(1, order+1):
-        acc = r[i]
-        for j in range(1, i):
-            acc += a[j] * r[i-j]
+        acc = r[i] + np.dot(a[1:i], r[i-1:0:-1])
         k[i-1] = -acc / e
         a[i] = k[i-1]
 
-        for j in range(order):
-            t[j] = a[j]
-
-        for j in range(1, i):
-            a[j] += k[i-1] * np.conj(t[i-j])
+        t[1:i] = a[i-1:0:-1]
+        a[1:i] += k[i-1] * np.conj(t[1:i])
 
         e *= 1 - k[i-1] * np.conj(k[i-1])
 
     return a, e, k
 
+def _batch_levinson(R, order):
+    """Levinson-Durbin recursion over many real autocorrelation sequences at
+    once.
+
+    Parameters
+    ----------
+    R : array
+        2D array of autocorrelations, one sequence per row.
+    order : int
+        LPC order.
+
+    Returns
+    -------
+    a : array
+        2D array of the solution for each row, as returned by ``levinson_1d``.
+    e : array
+        the prediction error of each row.
+    k : array
+        2D array of the reflection coefficients of each row.
+
+    Notes
+    -----
+    The recursion over the order is done in python, but each step updates
+    every row at once, so the cost in python calls does not depend on the
+    number of rows."""
+    if R.ndim != 2:
+        raise ValueError("Only rank 2 are supported.")
+    if order > R.shape[1] - 1:
+        raise ValueError("Order should be <= size-1")
+    if not np.all(np.isfinite(1/R[:, 0])):
+        raise ValueError("First item should be != 0")
+
+    num = R.shape[0]
+    a = np.zeros((num, order+1), R.dtype)
+    k = np.empty((num, order), R.dtype)
+
+    a[:, 0] = 1.
+    e = R[:, 0].copy()
+
+    for i in range(1, order+1):
+        acc = R[:, i] + np.sum(a[:, 1:i] * R[:, i-1:0:-1], axis=1)
+        k[:, i-1] = -acc / e
+        a[:, 1:i] += k[:, i-1, None] * a[:, i-1:0:-1]
+        a[:, i] = k[:, i-1]
+
+        e *= 1 - k[:, i-1] ** 2
+
+    return a, e, k
 
 def _acorr_last_axis(x, nfft, maxlag):
-    a = np.real(ifft(np.abs(fft(x, n=nfft) ** 2)))
+    a = irfft(np.abs(rfft(x, n=nfft)) ** 2, n=nfft)
     return a[..., :maxlag+1] / x.shape[-1]
 
 def acorr_lpc(x, axis=-1):
@@ -141,14 +183,16 @@ def acorr_lpc(x, axis=-1):
         raise ValueError("Complex input not supported yet")
 
     maxlag = x.shape[axis]
-    nfft = 2 ** nextpow2(2 * maxlag - 1)
+    # Lags up to maxlag are needed without circular wrap-around, so pad to
+    # at least 2 * maxlag, using the fastest length rather than a power of 2
+    nfft = next_fast_len(2 * maxlag, real=True)
+
+    if axis == -1 or axis == x.ndim - 1:
+        return _acorr_last_axis(x, nfft, maxlag)
 
-    if axis != -1:
-        x = np.swapaxes(x, -1, axis)
+    x = np.swapaxes(x, -1, axis)
     a = _acorr_last_axis(x, nfft, maxlag)
-    if axis != -1:
-        a = np.swapaxes(a, -1, axis)
-    return a
+    return np.swapaxes(a, -1, axis)
 
 def lpc(signal, order, axis=-1):
     """Compute the Linear Prediction Coefficients.
@@ -190,6 +234,79 @@ def lpc(signal, order, axis=-1):
     r = acorr_lpc(signal, axis)
     return levinson_1d(r, order)
 
+def _polyroots(A):
+    """Compute the roots of a stack of polynomials at once.
+
+    Parameters
+    ----------
+    A : array
+        2D array of polynomial coefficients, one polynomial per row,
+        ordered from the highest power as in ``np.roots``.  The leading
+        coefficient of each row must be non-zero.
+
+    Returns
+    -------
+    array
+        2D array of the roots of each polynomial.
+
+    Notes
+    -----
+    This builds the companion matrix of every polynomial as ``np.roots``
+    does, but solves all the eigenvalue problems in a single call.
+    ``np.linalg.eigvals`` loops over the stack in C and calls LAPACK's
+    ``geev`` without computing eigenvectors, so there is no per-polynomial
+    python overhead left to remove."""
+    num, p = A.shape
+    n = p - 1
+    C = np.zeros((num, n, n), dtype=A.dtype)
+    C[:, 0, :] = -A[:, 1:] / A[:, :1]
+    C[:, np.arange(1, n), np.arange(n - 1)] = 1
+    return np.linalg.eigvals(C)
+
+def lpc_formants(frames, num_formants, sr, max_freq):
+    """Estimate formants and their bandwidths from windowed frames using LPC.
+
+    Parameters
+    ----------
+    frames : array
+        2D array of windowed frames, one frame per row.
+    num_formants : int
+        Number of formants to estimate, the LPC order is twice this.
+    sr : numeric
+        Sampling rate of the frames.
+    max_freq : numeric
+        Maximum formant frequency, poles within 50 Hz of it or of 0 Hz are
+        discarded.
+
+    Returns
+    -------
+    array
+        3D array of shape (num_frames, num_formants, 2) containing the
+        frequency and bandwidth of each formant, padded with NaN when fewer
+        than `num_formants` formants are found in a frame.
+    """
+    order = num_formants*2
+    if order > frames.shape[1]:
+        raise ValueError("Input signal must have length >= order")
+    R = acorr_lpc(frames, axis=-1)
+    A, e, k = _batch_levinson(R, order)
+
+    roots = _polyroots(A)
+    angz = np.arctan2(np.imag(roots), np.real(roots))
+    frqs = angz * (sr / (2 * np.pi))
+    bw = -1/2*(sr/(2*np.pi))*np.log(np.abs(roots))
+
+    # Rejected poles are pushed to the end of each row by sorting them as inf
+    keep = (np.imag(roots) >= 0) & (frqs >= 50) & (frqs <= max_freq - 50)
+    frqs = np.where(keep, frqs, np.inf)
+    frq_inds = np.argsort(frqs, axis=1)[:, :num_formants]
+    frqs = np.take_along_axis(frqs, frq_inds, axis=1)
+    bw = np.take_along_axis(bw, frq_inds, axis=1)
+
+    output = np.stack((frqs, bw), axis=-1)
+    output[np.isinf(frqs)] = np.nan
+    return output
+
 class Formants(Representation):
 
     def __init__(self, filepath,max_freq, num_formants, win_len,
@@ -203,26 +320,51 @@ class Formants(Representation):
             self._win_len *= 2
 
         self._time_step = time_step
+        self._times = None
+        self._rep_array = None
+
+    @Representation.rep.setter
+    def rep(self, value):
+        self._rep = value
+        self._rep_array = None
+
+    def _formant_array(self):
+        """Return the formants and bandwidths of all frames as an array of
+        shape (num_frames, num_formants, 2), with frames sorted by time and
+        missing formants set to NaN.  The array is built from the time-keyed
+        representation the first time it is needed, and is read-only since
+        it is shared by every access."""
+        if self._rep_array is None:
+            times = sorted(self._rep.keys())
+            self._times = np.array(times, dtype = np.float64)
+            self._rep_array = np.array([self._rep[t] for t in times],
+                                dtype = np.float32).reshape(len(times), -1, 2)
+            self._rep_array.setflags(write=False)
+        return self._rep_array
 
     def __getitem__(self,key):
-        item = Representation.__getitem__(self, key)
-        return np.array([x[0] for x in item], dtype = np.float32)
+        if isinstance(key, str):
+            return Representation.__getitem__(self, key)
+        formants = self._formant_array()[:, :, 0]
+        times = self._times
+        if isinstance(key, tuple):
+            begin, end = key
+            return formants[np.searchsorted(times, begin, side = 'left'):
+                            np.searchsorted(times, end, side = 'right')]
+        i = np.searchsorted(times, key)
+        if i < len(times) and times[i] == key:
+            return formants[i]
+        if i == 0 or i == len(times):
+            return None
+        percent = (key - times[i-1]) / (times[i] - times[i-1])
+        return (formants[i-1] * (1 - percent)) + (formants[i] * percent)
 
     def to_array(self, value='formant'):
-        times = sorted(self._rep.keys())
-        ex = next(iter(self._rep.values()))
-        try:
-            frame_len = len(ex)
-        except:
-            frame_len = 1
-
-        output = np.zeros((len(times),frame_len))
-        for i, t in enumerate(times):
-            if value == 'formant':
-                output[i,:] = [x[0] for x in self._rep[t]]
-            elif value == 'bandwidth':
-                output[i,:] = [x[1] for x in self._rep[t]]
-        return output
+        if value == 'formant':
+            return self._formant_array()[:, :, 0].copy()
+        elif value == 'bandwidth':
+            return self._formant_array()[:, :, 1].copy()
+        raise ValueError("value must be either 'formant' or 'bandwidth'")
 
 class LpcFormants(Formants):
 
@@ -237,42 +379,26 @@ class LpcFormants(Formants):
         new_sr = 2 *self._freq_lims[1]
         alpha = np.exp(-2 * np.pi * 50 * (1/new_sr))
         self._sr, proc = preproc(self._filepath,alpha=alpha)
-        proc = resample(proc,int(ceil(proc.shape[0]/(self._sr/new_sr))))
+        proc = resample(proc,int(np.ceil(proc.shape[0]/(self._sr/new_sr))))
         nperseg = int(self._win_len*new_sr)
         nperstep = int(self._time_step*new_sr)
 
         if self._window_shape == 'gaussian':
             window = gaussian(nperseg+2,0.45*(nperseg-1)/2)[1:nperseg+1]
         else:
-            window = hanning(nperseg+2)[1:nperseg+1]
-        indices = arange(int(nperseg/2), proc.shape[0] - int(nperseg/2) + 1, nperstep)
-        num_frames = len(indices)
-
-        formants = zeros((num_frames,self._num_formants))
-        for i in range(num_frames):
-            X = proc[indices[i]-int(nperseg/2):indices[i]+int(nperseg/2)]
-            X = X * window
-            A, e, k  = lpc(X,self._num_formants*2)
-
-            rts = np.roots(A)
-            rts = np.array([r for r in rts if np.imag(r) >= 0])
-            angz = np.arctan2(np.imag(rts), np.real(rts))
-            frqs = angz * (new_sr / (2 * np.pi))
-            frq_inds = np.argsort(frqs)
-            frqs = frqs[frq_inds]
-            #print(frqs)
-            bw = -1/2*(new_sr/(2*np.pi))*np.log(np.abs(rts[frq_inds]))
-            formants = list()
-            for j,f in enumerate(frqs):
-                if f < 50:
-                    continue
-                if f > self._freq_lims[1] - 50:
-                    continue
-                formants.append((f,bw[j]))
-            missing = self._num_formants - len(formants)
-            if missing:
-                formants += [(None,None)] * missing
-            self._rep[indices[i]/new_sr] = formants
-            #raise(ValueError)
+            window = np.hanning(nperseg+2)[1:nperseg+1]
+        indices = np.arange(int(nperseg/2), proc.shape[0] - int(nperseg/2) + 1, nperstep)
+
+        halfperseg = int(nperseg/2)
+        frames = proc[indices[:, None] + np.arange(-halfperseg, halfperseg)]
+        frames *= window
+        formants = lpc_formants(frames, self._num_formants, new_sr,
+                                self._freq_lims[1])
+        self._times = indices/new_sr
+        self._rep_array = formants.astype(np.float32)
+        self._rep_array.setflags(write=False)
+        for i, t in enumerate(self._times):
+            self._rep[t] = [(f, b) if not np.isnan(f) else (None, None)
+                                            for f, b in formants[i]]
 
 
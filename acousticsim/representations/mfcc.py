@@ -1,7 +1,6 @@
-from numpy import (pad,log,array,zeros, floor,exp,sqrt,dot,arange,
-                    hanning,sin, pi,linspace,log10,round,maximum,minimum,
-                    sum,cos,spacing,diag,ceil)
-from numpy.fft import fft
+from functools import lru_cache
+
+import numpy as np
 
 from acousticsim.representations.base import Representation
 from acousticsim.representations.helper import preproc
@@ -11,8 +10,6 @@ from acousticsim.exceptions import MfccError
 
 from acousticsim.exceptions import AcousticSimError
 
-from scipy.fftpack import dct
-
 def freq_to_mel(freq):
     """Convert a value in Hertz to a value in mel.
 
@@ -28,7 +25,7 @@ def freq_to_mel(freq):
 
     """
 
-    return 2595 * log10(1+freq/700.0)
+    return 2595 * np.log10(1+freq/700.0)
 
 def mel_to_freq(mel):
     """Convert a value in mel to a value in Hertz.
@@ -48,26 +45,55 @@ def mel_to_freq(mel):
     return 700*(10**(mel/2595.0)-1)
 
 
-def _dct_spectrum(spec):
+@lru_cache(maxsize=16)
+def _dct_matrix(ncep, dtype=np.float64):
+    """Construct the type-III DCT matrix used to compute cepstra (following HTK).
+
+    Matrices are cached by size and type, as every Mfcc object with the same
+    number of filters shares one, so the returned array is read-only.
+
+    Parameters
+    ----------
+    ncep : int
+        Number of points in the spectrum.
+    dtype : data-type, optional
+        Type of the matrix, defaults to float64.
+
+    Returns
+    -------
+    array
+        DCT matrix of shape (ncep, ncep).
+
+    """
+    dctm = np.cos(np.outer(np.arange(ncep), np.arange(1,2*ncep,2)) / (2*ncep) * np.pi) * np.sqrt(2/ncep)
+    dctm = (dctm * 0.230258509299405).astype(dtype)
+    dctm.setflags(write=False)
+    return dctm
+
+def _dct_spectrum(spec, dctm = None):
     """Convert a spectrum into a cepstrum via type-III DCT (following HTK).
 
     Parameters
     ----------
     spec : array
-        Spectrum to perform a DCT on.
+        Spectrum to perform a DCT on, or a 2D array of spectra with
+        frames in the first dimension.
+    dctm : array, optional
+        Precomputed DCT matrix from ``_dct_matrix``, constructed from the
+        size of the spectrum if not specified.
 
     Returns
     -------
     array
-        Cepstrum of the input spectrum.
+        Cepstrum of the input spectrum, with the same shape as `spec`.
 
     """
-    ncep=spec.shape[0]
-    dctm = zeros((ncep,ncep))
-    for i in range(ncep):
-        dctm[i,:] = cos(i * arange(1,2*ncep,2)/(2*ncep) * pi) * sqrt(2/ncep)
-    dctm = dctm * 0.230258509299405
-    cep =  dot(dctm , (10*log10(spec + spacing(1))))
+    if dctm is None:
+        dctm = _dct_matrix(spec.shape[-1])
+    logspec = spec + spec.dtype.type(np.spacing(1))
+    np.log10(logspec, out=logspec)
+    logspec *= 10
+    cep =  np.dot(logspec, dctm.T)
     return cep
 
 class Mfcc(Representation):
@@ -137,21 +163,20 @@ class Mfcc(Representation):
 
         minMel = freq_to_mel(self._freq_lims[0])
         maxMel = freq_to_mel(self._freq_lims[1])
-        melPoints = linspace(minMel,maxMel,nfilt+2)
+        melPoints = np.linspace(minMel,maxMel,nfilt+2)
         binfreqs = mel_to_freq(melPoints)
-        bins = round((nfft-1)*binfreqs/sr)
+        bins = np.round((nfft-1)*binfreqs/sr)
 
-        fftfreqs = arange(int(nfft/2+1))/nfft * sr
+        fftfreqs = np.arange(int(nfft/2+1))/nfft * sr
 
-        fbank = zeros((nfilt,int(nfft/2 +1)))
-        for i in range(nfilt):
-            fs = binfreqs[i+arange(3)]
-            fs = fs[1] + (fs - fs[1])
-            loslope = (fftfreqs - fs[0])/(fs[1] - fs[0])
-            highslope = (fs[2] - fftfreqs)/(fs[2] - fs[1])
-            fbank[i,:] = maximum(zeros(loslope.shape),minimum(loslope,highslope))
+        lowfreqs = binfreqs[:-2, None]
+        centerfreqs = binfreqs[1:-1, None]
+        highfreqs = binfreqs[2:, None]
+        loslope = (fftfreqs - lowfreqs)/(centerfreqs - lowfreqs)
+        highslope = (highfreqs - fftfreqs)/(highfreqs - centerfreqs)
+        fbank = np.maximum(0, np.minimum(loslope,highslope))
         #fbank = fbank / max(sum(fbank,axis=1))
-        return fbank.transpose()
+        return fbank.transpose().astype(np.float32)
 
     def process(self,debug = True, signal = None, suppress_error = False):
         """
@@ -173,9 +198,8 @@ class Mfcc(Representation):
         self._duration = len(proc) / self._sr
 
         L = 22
-        n = arange(self._num_filters)
-        lift = 1+ (L/2)*sin(pi*n/L)
-        lift = diag(lift)
+        n = np.arange(self._num_filters)
+        lift = 1+ (L/2)*np.sin(np.pi*n/L)
 
         pspec = to_powerspec(proc,self._sr,self._win_len,self._time_step)
 
@@ -184,33 +208,36 @@ class Mfcc(Representation):
         except StopIteration:
             raise(MfccError('The file "{}" is too short to process (duration: {}; window size: {}).'.format(self._filepath, self._duration,self._win_len)))
         filterbank = self._filter_bank(nfft)
+        dctm = _dct_matrix(self._num_filters, np.float32)
+
+        times = sorted(pspec.keys())
+        magSpectrum = np.array([pspec[k] for k in times], dtype=np.float32)
+        np.sqrt(magSpectrum, out=magSpectrum)
+        filteredSpectrum = np.dot(magSpectrum, filterbank)
+        filteredSpectrum **= 2
+        dctSpectrum = _dct_spectrum(filteredSpectrum, dctm)
+        dctSpectrum *= lift
+        start = int(not self._use_power)
+        dctSpectrum = dctSpectrum[:, start:start + self._num_coeffs]
 
-        self._rep = dict()
-        aspec = dict()
-        for k in pspec:
-            filteredSpectrum = dot(sqrt(pspec[k]), filterbank)**2
-            aspec[k] = filteredSpectrum
-            dctSpectrum = _dct_spectrum(filteredSpectrum)
-            dctSpectrum = dot(dctSpectrum , lift)
-            if not self._use_power:
-                dctSpectrum = dctSpectrum[1:]
-            self._rep[k] = dctSpectrum[:self._num_coeffs]
+        self._rep = dict(zip(times, dctSpectrum))
+        aspec = dict(zip(times, filteredSpectrum))
 
         #Calculate deltas
         if self._deltas:
             keys = sorted(self._rep.keys())
             for i,k in enumerate(keys):
                 if i == 0 or i == len(self._rep.keys()) - 1:
-                    self._rep[k] = array(list(self._rep[k]) + [0 for x in range(self._num_coeffs)])
+                    self._rep[k] = np.array(list(self._rep[k]) + [0 for x in range(self._num_coeffs)])
                 else:
                     deltas = self._rep[keys[i+1]][:self._num_coeffs] - self._rep[keys[i-1]][:self._num_coeffs]
-                    self._rep[k] = array(list(self._rep[k]) + list(deltas))
+                    self._rep[k] = np.array(list(self._rep[k]) + list(deltas))
             for i,k in enumerate(keys):
                 if i == 0 or i == len(self._rep.keys()) - 1:
-                    self._rep[k] = array(list(self._rep[k]) + [0 for x in range(self._num_coeffs)])
+                    self._rep[k] = np.array(list(self._rep[k]) + [0 for x in range(self._num_coeffs)])
                 else:
                     deltas = self._rep[keys[i+1]][self._num_coeffs:self._num_coeffs*2] - self._rep[keys[i-1]][self._num_coeffs:self._num_coeffs*2]
-                    self._rep[k] = array(list(self._rep[k]) + list(deltas))
+                    self._rep[k] = np.array(list(self._rep[k]) + list(deltas))
 
         if debug:
             return pspec,aspec
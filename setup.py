@@ -47,8 +47,8 @@ setup(name='acousticsim',
                 'acousticsim.clustering'],
       package_data={'acousticsim.praat': ['*.praat']},
       install_requires=[
-            'numpy',
-            'scipy',
+            'numpy>=1.15',
+            'scipy>=1.4',
             'scikit-learn',
             'networkx',
             'textgrid',
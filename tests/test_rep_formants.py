@@ -1,10 +1,82 @@
 
+import numpy as np
+import pytest
+from scipy.linalg import toeplitz
+from scipy.signal import lfilter
 
-
-from acousticsim.representations.formants import LpcFormants
+from acousticsim.representations.formants import (Formants, LpcFormants, levinson_1d,
+                                                    lpc, lpc_ref, lpc_formants,
+                                                    _batch_levinson)
 
 from numpy.testing import assert_array_almost_equal
 
+def test_levinson():
+    x = np.sin(np.arange(400) * 0.3) + np.cos(np.arange(400) * 0.05)
+    r = np.correlate(x, x, 'full')[x.size-1:] / x.size
+    order = 10
+    a, e, k = levinson_1d(r, order)
+    expected = np.linalg.solve(toeplitz(r[:order]), -r[1:order+1])
+    assert_array_almost_equal(a[1:], expected)
+
+def test_batch_levinson():
+    t = np.arange(400)
+    frames = np.array([np.sin(t * f) + np.cos(t * 0.05) for f in (0.1, 0.3, 0.7)])
+    R = np.array([np.correlate(x, x, 'full')[x.size-1:] / x.size for x in frames])
+    A, E, K = _batch_levinson(R, 10)
+    for i in range(R.shape[0]):
+        a, e, k = levinson_1d(R[i], 10)
+        assert_array_almost_equal(A[i], a)
+        assert_array_almost_equal(K[i], k)
+
+def test_lpc_ref():
+    x = np.sin(np.arange(400) * 0.3) + np.cos(np.arange(400) * 0.05)
+    with pytest.deprecated_call():
+        a_ref = lpc_ref(x, 10)
+    a, e, k = lpc(x, 10)
+    assert_array_almost_equal(a_ref, a)
+
+def test_lpc_formants():
+    sr, max_freq, num_formants = 11000, 5500, 5
+    t = np.arange(275)
+    frames = np.array([np.sin(2*np.pi*700*t/sr) + 0.5*np.sin(2*np.pi*1200*t/sr)
+                            + 0.3*np.sin(2*np.pi*2500*t/sr),
+                       np.random.RandomState(0).randn(275),
+                       lfilter([1], [1, -0.9], np.random.RandomState(1).randn(275))])
+    frames *= np.hanning(275)
+    formants = lpc_formants(frames, num_formants, sr, max_freq)
+    assert formants.shape == (3, num_formants, 2)
+    for i, x in enumerate(frames):
+        A, e, k = lpc(x, num_formants*2)
+        rts = np.roots(A)
+        rts = rts[np.imag(rts) >= 0]
+        frqs = np.arctan2(np.imag(rts), np.real(rts)) * (sr / (2 * np.pi))
+        bw = -1/2*(sr/(2*np.pi))*np.log(np.abs(rts))
+        keep = (frqs >= 50) & (frqs <= max_freq - 50)
+        frqs, bw = frqs[keep], bw[keep]
+        inds = np.argsort(frqs)
+        expected = np.full((num_formants, 2), np.nan)
+        expected[:len(inds), 0] = frqs[inds]
+        expected[:len(inds), 1] = bw[inds]
+        assert_array_almost_equal(formants[i], expected)
+    # One pole of the lowpassed noise falls outside the frequency limits
+    assert np.isnan(formants[2, 4:]).all()
+    assert not np.isnan(formants[2, :4]).any()
+
+def test_formants_getitem():
+    formants = Formants(None, 5500, 2, 0.025, 0.01)
+    formants.rep = {0.01: [(500, 50), (None, None)],
+                    0.0: [(400, 40), (1500, 60)]}
+    assert_array_almost_equal(formants.to_array(), [[400, 1500], [500, np.nan]])
+    assert_array_almost_equal(formants.to_array('bandwidth'), [[40, 60], [50, np.nan]])
+    assert_array_almost_equal(formants[0.0], [400, 1500])
+    assert_array_almost_equal(formants[0.005], [450, np.nan])
+    assert_array_almost_equal(formants[0.0, 0.01], [[400, 1500], [500, np.nan]])
+    assert formants[0.02] is None
+    output = formants.to_array()
+    output[0, 0] = 0
+    assert_array_almost_equal(formants.to_array()[0], [400, 1500])
+    assert_array_almost_equal(formants[0.0], [400, 1500])
+
 def test_lpc(base_filenames):
     for f in base_filenames:
         if f.startswith('silence'):
@@ -13,4 +85,3 @@ def test_lpc(base_filenames):
         print(f)
         formants = LpcFormants(wavpath, max_freq = 5500,
                     num_formants = 5, win_len = 0.025, time_step = 0.01)
-
@@ -24,7 +24,7 @@ def test(base_filenames):
         pspec, aspec = mfcc.process(debug=True)
         #assert_array_almost_equal(m['pspectrum'].T,pspec,decimal=4)
         #assert_array_almost_equal(m['aspectrum'].T,aspec,decimal=4)
-        assert_array_almost_equal(m['cepstra'].T,mfcc.to_array())
+        assert_array_almost_equal(m['cepstra'].T,mfcc.to_array(),decimal=4)
 
 def test_deltas(base_filenames):
     for f in base_filenames: